@@ -4,12 +4,22 @@ import sys
 import re
 import json
 import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
 import shutil
+import threading
+from collections import defaultdict, deque
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import orjson
 from rapidfuzz import process, fuzz
 from weasyprint import HTML
 import mistune
 from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pathlib import Path
 from PIL import Image
 import io
@@ -26,15 +36,103 @@ HEADERS = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {API_TOKEN}"
 }
+API_CONCURRENCY = 32  # Maximum number of API requests in flight at once
+API_TIMEOUT = 30  # Seconds to wait for a single API call
+
+# Shared session so every API call reuses pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=API_CONCURRENCY, pool_maxsize=API_CONCURRENCY))
 
 # === CONFIGURATION ===
 OUTPUT_DIR = "html-output"  # Directory for HTML output
+EXPORT_WORKERS = 16  # Number of pages exported in parallel
 ASSETS_DIR = os.path.join(OUTPUT_DIR, "assets")  # Directory for assets
 CSS_FILE = "styles.css"  # CSS file name
+IMAGE_CACHE_DIR = os.path.join(".cache", "img")  # Optimized images kept between runs, keyed by source content
 
 # Logseq assets configuration - set your primary assets location here
 LOGSEQ_ASSETS_PATH = "/Users/job/Library/CloudStorage/SynologyDrive-on-demand/database/assets"
 
+# Common Logseq asset locations, starting with the configured path
+ASSET_LOCATIONS = [
+    LOGSEQ_ASSETS_PATH,  # Primary configured location
+    "assets",  # Current directory assets
+    "~/Documents/logseq/assets",  # Default Logseq location
+    "~/logseq/assets",  # Alternative Logseq location
+    "~/Library/CloudStorage/SynologyDrive-on-demand/database/assets",  # Synology location
+]
+
+# (normalized stem, extension or None) -> full path, filled by build_asset_index()
+ASSET_INDEX = {}
+_ASSET_NAME_SEPARATORS = re.compile(r'[-_]')
+
+# Images found while exporting pages are optimized together afterwards;
+# until then pages refer to them through a placeholder
+_IMAGE_JOBS = {}  # Source path -> job index
+_IMAGE_PATHS = {}  # Job index -> relative path of the optimized image
+_IMAGE_PLACEHOLDER = "\0image:{}\0"
+_IMAGE_PLACEHOLDER_PATTERN = re.compile(r'\0image:(\d+)\0')
+_IMAGE_PLACEHOLDER_TAG_PATTERN = re.compile(r'<img src="\0image:(\d+)\0"[^>]*>')
+
+# Source path -> path returned by copy_asset, so every asset is handled once per run
+_COPIED_ASSETS = {}
+_ASSETS_LOCK = threading.Lock()  # Guards _IMAGE_JOBS and _COPIED_ASSETS across export threads
+
+# === PRECOMPILED PATTERNS ===
+# Characters that are not allowed in generated page filenames
+_UNSAFE_CHARS = re.compile(r'[^a-zA-Z0-9\-_]')
+_UNSAFE_ASSET_CHARS = re.compile(r'[^a-zA-Z0-9._-]')
+
+# Logseq syntax
+_PAGE_LINK = re.compile(r'\[\[([^\]]+)\]\]')
+_TAG_LINK = re.compile(r'#\[\[([^\]]+)\]\]')
+_BLOCK_REF = re.compile(r'\(\(([a-f0-9-]+)\)\)')
+_BLOCK_ID = re.compile(r'\s*id::\s*[a-f0-9-]+')
+_UUID = re.compile(r'\s*[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}')
+_PUBLIC_PROPERTY = re.compile(r'\s*public::\s*(true|children)')
+_PROPERTY = re.compile(r'^([a-zA-Z][a-zA-Z0-9-_]*)::(.+?)$')
+
+# Joins block contents for batched link resolution. The lone "]" can never be part
+# of a [[link]], so no match crosses from one block into the next.
+_BLOCK_SEPARATOR = "\x1e]\x1e"
+
+# Task markers, replaced in a single pass through the maps below
+_TASK_MARKER = re.compile(r'^(DONE|DOING|TODO|NOW|LATER) ')
+_TASK_MARKER_LINES = re.compile(r'^(DONE|DOING|TODO|NOW|LATER) ', re.MULTILINE)
+_TASK_ICONS = {"DONE": "☑️ ", "DOING": "⏳ ", "TODO": "☐ ", "NOW": "▶️ ", "LATER": "⏰ "}
+_TASK_CHECKBOXES = {"DONE": "- [x] ", "DOING": "- [ ] ", "TODO": "- [ ] ", "NOW": "- [ ] ", "LATER": "- [ ] "}
+
+# Inline formatting, matched in one pass: bold italic, bold, italic, strikethrough,
+# highlight, code, URL and page link. Longer * runs come first so *** and ** aren't
+# read as shorter ones. Bold never closes on part of a longer * run, so it can end
+# with an italic span. Italic may contain bold, and neither its opening nor its
+# closing * can be part of a **, so a lone * before **bold** stays literal.
+_INLINE = re.compile(
+    r'\*\*\*(.+?)\*\*\*'
+    r'|\*\*(?!\*)(.+?)\*\*(?!\*)'
+    r'|\*((?:\*\*.+?\*\*|[^*])+?)\*(?!\*)'
+    r'|~~(.+?)~~|==(.+?)==|`([^`]+)`|(https?://\S+)|\[\[([^\]]+)\]\]'
+)
+_INLINE_TAGS = {2: "strong", 3: "em", 4: "del", 5: "mark"}
+
+# Images
+_MD_IMAGE = re.compile(r'!\[(?:[^\]]*)\]\(([^)]+)\)')
+_HTML_IMAGE = re.compile(r'<img[^>]+src="([^"]+)"[^>]*>')
+_PARENT_DIRS = re.compile(r'\.\./+')
+_ASSET_DIR_PREFIX = re.compile(r'^(assets/|img/)')
+
+# Excerpts
+_LIST_MARKER = re.compile(r'^[-*] ')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Markdown renderer with custom options, built once and shared by all conversions.
+# mistune keeps per-document state in the parse call, so one instance is thread-safe.
+_MD = mistune.create_markdown(
+    escape=False,  # Don't escape HTML
+    plugins=['strikethrough', 'footnotes', 'table'],
+    hard_wrap=True  # Convert newlines to <br>
+)
+
 # Initialize rich console
 console = Console()
 
@@ -50,15 +148,28 @@ def log_warning(message):
 def log_error(message):
     console.print(f"[red]✗[/red] {message}")
 
+def status(message):
+    """Show a spinner on the main thread; rich only allows one live display at a time."""
+    if threading.current_thread() is threading.main_thread():
+        return console.status(message, spinner="dots")
+    return contextlib.nullcontext()
+
+# Translation table for escaping text interpolated into HTML
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})
+
+def esc(text):
+    """Escape page titles and other user content for use in HTML."""
+    return text.translate(_HTML_ESCAPE)
+
 def api_call(method, args):
     """Make an API call to Logseq."""
     payload = {"method": method, "args": args}
     try:
-        with console.status(f"[blue]Making API call: [cyan]{method}[/cyan]...", spinner="dots"):
-            response = requests.post(API_URL, headers=HEADERS, json=payload)
+        with status(f"[blue]Making API call: [cyan]{method}[/cyan]..."):
+            response = _SESSION.post(API_URL, headers=HEADERS, data=orjson.dumps(payload), timeout=API_TIMEOUT)
             if response.ok:
                 log_success(f"API call successful: {method}")
-                return response.json()
+                return orjson.loads(response.content)
             else:
                 log_error(f"API call error for {method}: {response.text}")
                 return None
@@ -66,6 +177,31 @@ def api_call(method, args):
         log_error(f"Exception during API call: {e}")
         return None
 
+async def api_call_async(client, semaphore, method, args):
+    """Make an API call to Logseq without blocking other in-flight calls."""
+    payload = {"method": method, "args": args}
+    try:
+        async with semaphore:
+            response = await client.post(API_URL, headers=HEADERS, content=orjson.dumps(payload))
+        if response.is_success:
+            return orjson.loads(response.content)
+        log_error(f"API call error for {method}: {response.text}")
+        return None
+    except Exception as e:
+        log_error(f"Exception during API call: {e}")
+        return None
+
+async def gather_blocks(uuids):
+    """Fetch the block trees of the given pages concurrently. Returns {uuid: blocks}."""
+    semaphore = asyncio.Semaphore(API_CONCURRENCY)
+    limits = httpx.Limits(max_connections=API_CONCURRENCY, max_keepalive_connections=API_CONCURRENCY)
+    async with httpx.AsyncClient(http2=False, limits=limits, timeout=API_TIMEOUT) as client:
+        results = await asyncio.gather(*[
+            api_call_async(client, semaphore, "logseq.Editor.getPageBlocksTree", [uuid])
+            for uuid in uuids
+        ])
+    return dict(zip(uuids, results))
+
 def get_page_property(page, property_name):
     """Get a specific property from a page."""
     if not page or "properties" not in page:
@@ -85,24 +221,35 @@ def is_public_children(page):
     public_prop = get_page_property(page, "public")
     return public_prop == "children"
 
-def get_nested_pages(page_name):
+# Result of logseq.Editor.getAllPages, fetched once per run
+_all_pages_cache = None
+
+def get_all_pages(refresh=False):
+    """Get all pages from Logseq, reusing the previous result unless refresh is set."""
+    global _all_pages_cache
+    if _all_pages_cache is None or refresh:
+        pages = api_call("logseq.Editor.getAllPages", [])
+        if not pages:
+            return []
+        _all_pages_cache = pages
+    return _all_pages_cache
+
+def get_pages_by_name(pages):
+    """Map each page's stripped name (or title) to the page object."""
+    return {(p.get("name") or p.get("title", "")).strip(): p for p in pages}
+
+def get_nested_pages(page_name, pages_by_name):
     """Get all pages that are nested under the given page name."""
     nested_pages = []
-    pages = api_call("logseq.Editor.getAllPages", [])
-    if not pages:
-        return []
-    
     base_path = page_name.strip() + "/"
-    for page in pages:
-        name = (page.get("name") or page.get("title", "")).strip()
+    for name, page in pages_by_name.items():
         if name.startswith(base_path):
             nested_pages.append(page)
     return nested_pages
 
-def get_public_pages():
+def get_public_pages(pages_by_name):
     """Get all pages that are marked as public or have public children."""
-    pages = api_call("logseq.Editor.getAllPages", [])
-    if not pages:
+    if not pages_by_name:
         return []
     
     public_pages = {}
@@ -117,36 +264,81 @@ def get_public_pages():
             page_id = page.get("id")  # Get the page ID (it's an integer)
             if uuid and title and page_id is not None and title not in processed_pages:
                 processed_pages.add(title)
+                parts = tuple(title.split('/'))
                 public_pages[title] = {
                     "uuid": uuid,
                     "title": title,
                     "id": page_id,
-                    "has_public_children": is_public_children(page)
+                    "has_public_children": is_public_children(page),
+                    "parts": parts,  # Path segments of the title
+                    "parent": '/'.join(parts[:-1]) if len(parts) > 1 else None,  # Parent path, None for top-level pages
+                    "leaf": parts[-1]  # Last path segment
                 }
                 console.print(f"[green]✓[/green] Added page: {title} (ID: {page_id})")
 
         # First pass: collect directly public pages and pages with public children
-        for page in pages:
-            title = (page.get("name") or page.get("title", "")).strip()
+        for title, page in pages_by_name.items():
             if is_page_public(page):
                 add_page(page)
                 
                 # If this page has public children, add all nested pages
                 if is_public_children(page):
-                    nested_pages = get_nested_pages(title)
+                    nested_pages = get_nested_pages(title, pages_by_name)
                     for nested_page in nested_pages:
                         add_page(nested_page)
 
     return public_pages
 
+@functools.lru_cache(maxsize=None)
 def sanitize_filename(title):
     """Convert a page title to a safe filename."""
     # Replace slashes with dashes
     safe_name = title.replace('/', '-')
     # Replace any other unsafe characters
-    safe_name = re.sub(r'[^a-zA-Z0-9\-_]', '_', safe_name)
+    safe_name = _UNSAFE_CHARS.sub('_', safe_name)
     return safe_name.lower()
 
+def write_file(path, data):
+    """Write a complete file with a single unbuffered write; text is encoded as UTF-8."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _temp_path(path):
+    """Get a temporary path next to path that is unique to this process and thread."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def replace_file(path, data):
+    """
+    Write a file through a temporary file and rename it into place, so concurrent
+    writers of the same path never leave a partial or interleaved file behind.
+    """
+    tmp_path = _temp_path(path)
+    try:
+        write_file(tmp_path, data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+def replace_file_with_copy(src_path, path):
+    """Copy a file into place through a temporary file, like replace_file()."""
+    tmp_path = _temp_path(path)
+    try:
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
 def setup_output_directory():
     """Setup the output directory and copy necessary assets."""
     # Clean up and create output directory
@@ -154,20 +346,25 @@ def setup_output_directory():
         shutil.rmtree(OUTPUT_DIR)
     os.makedirs(OUTPUT_DIR)
     os.makedirs(ASSETS_DIR)
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
     
     # Copy CSS file to output directory
     shutil.copy2(CSS_FILE, os.path.join(OUTPUT_DIR, CSS_FILE))
+    
+    # Index the Logseq assets so image lookups don't hit the filesystem
+    build_asset_index()
 
-def get_first_sentence(page_name):
+def get_first_sentence(title, public_pages, blocks_cache):
     """Get the first meaningful sentence from a page's content."""
-    pages = api_call("logseq.Editor.getAllPages", [])
-    page = next((p for p in pages if (p.get("name") or p.get("title", "")).strip() == page_name), None)
-    
-    if not page:
+    page_info = public_pages.get(title)
+    if not page_info:
         return ""
     
-    # Get the page's blocks
-    blocks = api_call("logseq.Editor.getPageBlocksTree", [page["uuid"]])
+    # Get the page's blocks, falling back to a direct call if the batch missed it
+    uuid = page_info["uuid"]
+    blocks = blocks_cache.get(uuid)
+    if blocks is None:
+        blocks = api_call("logseq.Editor.getPageBlocksTree", [uuid])
     if not blocks:
         return ""
 
@@ -192,11 +389,11 @@ def get_first_sentence(page_name):
     
     # Clean the content
     content = clean_logseq_metadata(content)
-    content = re.sub(r'^[-*] ', '', content)  # Remove list markers
-    content = re.sub(r'\[\[([^\]]+)\]\]', r'\1', content)  # Remove link markers
+    content = _LIST_MARKER.sub('', content)  # Remove list markers
+    content = _PAGE_LINK.sub(r'\1', content)  # Remove link markers
     
     # Get first sentence
-    sentences = re.split(r'(?<=[.!?])\s+', content)
+    sentences = _SENTENCE_END.split(content)
     if sentences:
         first_sentence = sentences[0].strip()
         # If sentence is too long, truncate it
@@ -213,9 +410,9 @@ def get_page_filename(page_info):
         return f"{sanitize_filename(page_info['title'])}.html"
     return f"page_{page_id}.html"
 
-def generate_index_page(public_pages):
+def generate_index_page(public_pages, blocks_cache):
     """Generate an index page with links to all public pages."""
-    html = f"""<!DOCTYPE html>
+    parts = [f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -227,7 +424,7 @@ def generate_index_page(public_pages):
     <main>
         <article>
             <h1>De Amaristische Zee</h1>
-            <div class="page-list">"""
+            <div class="page-list">"""]
     
     # Sort pages by title
     sorted_pages = sorted(public_pages.items(), key=lambda x: x[0])
@@ -235,75 +432,79 @@ def generate_index_page(public_pages):
     for title, page_info in sorted_pages:
         filename = get_page_filename(page_info)
         # Get the last part of the path for display
-        display_title = title.split('/')[-1].replace('_', ' ').title()
+        display_title = page_info["leaf"].replace('_', ' ').title()
         
         # Get first sentence
-        first_sentence = get_first_sentence(title)
+        first_sentence = get_first_sentence(title, public_pages, blocks_cache)
         
-        html += f"""
+        parts.append(f"""
                 <a href="{filename}" class="page-list-item">
                     <div class="page-list-content">
-                        <h3>{display_title}</h3>"""
+                        <h3>{esc(display_title)}</h3>""")
         
         # If it's a nested page, show the parent path
-        if '/' in title:
-            parent_path = '/'.join(title.split('/')[:-1])
-            html += f"""
-                        <p class="page-path">{parent_path}</p>"""
+        if page_info["parent"] is not None:
+            parts.append(f"""
+                        <p class="page-path">{esc(page_info["parent"])}</p>""")
         
         if first_sentence:
-            html += f"""
-                        <p class="page-excerpt">{first_sentence}</p>"""
+            parts.append(f"""
+                        <p class="page-excerpt">{esc(first_sentence)}</p>""")
             
-        html += """
+        parts.append("""
                     </div>
-                </a>"""
+                </a>""")
     
-    html += """
+    parts.append("""
             </div>
         </article>
     </main>
 </body>
-</html>"""
+</html>""")
+    html = "".join(parts)
     
     # Write to file
     filepath = os.path.join(OUTPUT_DIR, "index.html")
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(html)
+    write_file(filepath, html)
+
+def build_children_index(public_pages):
+    """Map every page path prefix to the titles of all pages nested below it."""
+    children_index = defaultdict(list)
+    for title, page_info in public_pages.items():
+        parts = page_info["parts"]
+        for i in range(1, len(parts)):
+            children_index['/'.join(parts[:i])].append(title)
+    return children_index
 
-def get_page_children(title, public_pages):
+def get_page_children(title, children_index):
     """Get all child pages for a given page title."""
-    children = []
-    base = title + "/"
-    for page_title in public_pages.keys():
-        if page_title.startswith(base):
-            children.append(page_title)
-    return sorted(children)
-
-def generate_hierarchy_section(title, public_pages):
+    return sorted(children_index.get(title, []))
+
+def generate_hierarchy_section(title, public_pages, children_index):
     """Generate hierarchy section if the page has children."""
-    children = get_page_children(title, public_pages)
+    children = get_page_children(title, children_index)
     if not children:
         return ""
     
-    html = '<section class="hierarchy-section">\n'
-    html += '<h2>Related Pages</h2>\n'
-    html += '<ul class="hierarchy-list">\n'
+    parts = [
+        '<section class="hierarchy-section">\n',
+        '<h2>Related Pages</h2>\n',
+        '<ul class="hierarchy-list">\n',
+    ]
     
     for child in children:
         child_info = public_pages[child]
         filename = get_page_filename(child_info)
-        display_name = child.split('/')[-1].replace('_', ' ').title()
-        html += f'<li><a href="{filename}">{display_name}</a></li>\n'
+        display_name = child_info["leaf"].replace('_', ' ').title()
+        parts.append(f'<li><a href="{filename}">{esc(display_name)}</a></li>\n')
     
-    html += '</ul>\n</section>\n'
-    return html
+    parts.append('</ul>\n</section>\n')
+    return "".join(parts)
 
-def export_page_to_html(page_name, public_pages):
+def export_page_to_html(page_name, public_pages, pages_by_name, blocks_cache, children_index):
     """Export a page to HTML using Logseq's API."""
     # First, get the page object
-    pages = api_call("logseq.Editor.getAllPages", [])
-    page = next((p for p in pages if (p.get("name") or p.get("title", "")).strip() == page_name), None)
+    page = pages_by_name.get(page_name)
     
     if not page:
         print(f"Page not found: {page_name}")
@@ -315,45 +516,44 @@ def export_page_to_html(page_name, public_pages):
         print(f"Failed to get content for page: {page_name}")
         return None
     
-    # Get the page's blocks
-    blocks = api_call("logseq.Editor.getPageBlocksTree", [page["uuid"]])
+    # Get the page's blocks, falling back to a direct call if the batch missed it
+    blocks = blocks_cache.get(page["uuid"])
+    if blocks is None:
+        blocks = api_call("logseq.Editor.getPageBlocksTree", [page["uuid"]])
     if not blocks:
         print(f"Failed to get blocks for page: {page_name}")
         return None
 
     # Convert blocks to HTML
-    html_content = f"""<!DOCTYPE html>
+    parts = [f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{page_name}</title>
+    <title>{esc(page_name)}</title>
     <link rel="stylesheet" href="{CSS_FILE}">
 </head>
 <body>
     <main>
         <article>
             <a href="index.html" class="back-to-index">Back to Index</a>
-            <h1>{page_name}</h1>
-"""
+            <h1>{esc(page_name)}</h1>
+"""]
 
     def process_block(block):
+        """Append the block's HTML, including its children, to parts."""
         if not block:
-            return ""
+            return
         
         content = block.get("content", "").strip()
         if not content:
-            return ""
+            return
         
         # Clean metadata first
         content = clean_logseq_metadata(content)
         
         # Process task markers
-        content = re.sub(r'^DONE ', '☑️ ', content)
-        content = re.sub(r'^DOING ', '⏳ ', content)
-        content = re.sub(r'^TODO ', '☐ ', content)
-        content = re.sub(r'^NOW ', '▶️ ', content)
-        content = re.sub(r'^LATER ', '⏰ ', content)
+        content = _TASK_MARKER.sub(lambda m: _TASK_ICONS[m.group(1)], content)
         
         # Split content into lines and process each line
         lines = content.split('\n')
@@ -362,20 +562,8 @@ def export_page_to_html(page_name, public_pages):
         for line in lines:
             line = line.strip()
             if line:
-                # Process Logseq's markdown-style formatting
-                line = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', line)
-                line = re.sub(r'\*(.+?)\*', r'<em>\1</em>', line)
-                line = re.sub(r'~~(.+?)~~', r'<del>\1</del>', line)
-                line = re.sub(r'==(.+?)==', r'<mark>\1</mark>', line)
-                
-                # Process links using resolve_links_for_html
-                line = resolve_links_for_html(line, public_pages)
-                
-                # Convert URLs to links
-                line = re.sub(r'(https?://\S+)', r'<a href="\1">\1</a>', line)
-                
-                # Process code blocks
-                line = re.sub(r'`([^`]+)`', r'<code>\1</code>', line)
+                # Process formatting, code, URLs and page links in one pass
+                line = format_inline(line, public_pages)
                 
                 # Process images
                 line = process_image_links(line)
@@ -383,38 +571,40 @@ def export_page_to_html(page_name, public_pages):
                 # Wrap line in paragraph
                 processed_lines.append(f"<p>{line}</p>")
         
-        html = f"<div class='block'>{chr(10).join(processed_lines)}"
+        parts.append("<div class='block'>")
+        parts.append("\n".join(processed_lines))
         
         # Process children
         children = block.get("children", [])
         if children:
-            html += "<ul>"
+            parts.append("<ul>")
             for child in children:
-                html += f"<li>{process_block(child)}</li>"
-            html += "</ul>"
+                parts.append("<li>")
+                process_block(child)
+                parts.append("</li>")
+            parts.append("</ul>")
         
-        html += "</div>"
-        return html
+        parts.append("</div>")
 
     # Process all blocks
     if isinstance(blocks, list):
         for block in blocks:
-            html_content += process_block(block)
+            process_block(block)
     else:
-        html_content += process_block(blocks)
+        process_block(blocks)
 
     # Add hierarchy section if this page has children
-    hierarchy_html = generate_hierarchy_section(page_name, public_pages)
+    hierarchy_html = generate_hierarchy_section(page_name, public_pages, children_index)
     if hierarchy_html:
-        html_content += hierarchy_html
+        parts.append(hierarchy_html)
 
-    html_content += """
+    parts.append("""
         </article>
     </main>
 </body>
-</html>"""
+</html>""")
 
-    return html_content
+    return "".join(parts)
 
 def optimize_image(src_path, max_width=2000):
     """
@@ -426,6 +616,12 @@ def optimize_image(src_path, max_width=2000):
     """
     try:
         with Image.open(src_path) as img:
+            # Let libjpeg decode large JPEGs at a reduced scale (1/2, 1/4, 1/8); twice
+            # the target width leaves headroom for the LANCZOS resize below.
+            # This is a no-op for other formats.
+            if img.width > max_width * 2:
+                img.draft('RGB', (max_width * 2, max(1, img.height * max_width * 2 // img.width)))
+
             # Convert to RGB if RGBA (this removes transparency but is better for web)
             if img.mode == 'RGBA':
                 bg = Image.new('RGB', img.size, 'WHITE')
@@ -455,105 +651,202 @@ def optimize_image(src_path, max_width=2000):
         print(f"Error optimizing image {src_path}: {e}")
         return None
 
+def get_asset_filename(src_path):
+    """Get a safe filename for an asset in the assets directory."""
+    return _UNSAFE_ASSET_CHARS.sub('_', os.path.basename(src_path))
+
+def optimize_image_to_disk(src_path):
+    """
+    Optimize an image into the assets directory, copying it unchanged if that fails.
+    Runs in a worker process. Returns the new relative path.
+    """
+    filename = os.path.basename(src_path)
+    safe_filename = get_asset_filename(src_path)
+    try:
+        # Always save as .jpg for consistency
+        jpg_filename = os.path.splitext(safe_filename)[0] + '.jpg'
+        dest_path = os.path.join(ASSETS_DIR, jpg_filename)
+        
+        # Reuse the result of an earlier run if the source content hasn't changed
+        with open(src_path, 'rb') as f:
+            key = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        cache_path = os.path.join(IMAGE_CACHE_DIR, f"{key}.jpg")
+        if os.path.exists(cache_path):
+            replace_file_with_copy(cache_path, dest_path)
+            print(f"Reused cached image: {filename}")
+            return f"assets/{jpg_filename}"
+        
+        # Optimize the image
+        optimized_data = optimize_image(src_path)
+        if optimized_data:
+            # Write the optimized image. Different sources can share a destination
+            # name (foo.png and foo.jpg), so write it atomically
+            replace_file(dest_path, optimized_data)
+            
+            # Write through to the cache. The optimized image is already in place,
+            # so a failure here only costs the cache entry
+            try:
+                replace_file(cache_path, optimized_data)
+            except Exception as e:
+                print(f"Failed to cache optimized image {filename}: {e}")
+            
+            print(f"Optimized image: {filename}")
+            return f"assets/{jpg_filename}"
+    except Exception as e:
+        print(f"Failed to optimize image {filename}: {e}")
+        # Fall back to regular copy if optimization fails
+    
+    try:
+        replace_file_with_copy(src_path, os.path.join(ASSETS_DIR, safe_filename))
+    except Exception as e:
+        print(f"Failed to copy image {filename}: {e}")
+        return None
+    return f"assets/{safe_filename}"
+
+def optimize_pending_images():
+    """Optimize all images collected by copy_asset that haven't been processed yet."""
+    with _ASSETS_LOCK:
+        jobs = [(src_path, index) for src_path, index in _IMAGE_JOBS.items() if index not in _IMAGE_PATHS]
+    if not jobs:
+        return
+    
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        new_paths = pool.map(optimize_image_to_disk, [src_path for src_path, _ in jobs], chunksize=4)
+        for (_, index), new_path in zip(jobs, new_paths):
+            _IMAGE_PATHS[index] = new_path
+
+def write_pages(pages):
+    """
+    Optimize all queued images once, then write the pages with their image
+    placeholders resolved. Takes a dict of {filename: html}.
+    """
+    # Optimize every referenced image once, spread over all cores
+    print("\nOptimizing images...")
+    optimize_pending_images()
+
+    # Write the pages now that the image paths are known
+    for filename, html in pages.items():
+        filepath = os.path.join(OUTPUT_DIR, filename)
+        write_file(filepath, resolve_image_placeholders(html, filename))
+        print(f"Generated: {filename}")
+
+def resolve_image_placeholders(html, filename=""):
+    """
+    Replace the image placeholders left by copy_asset with the optimized asset
+    paths. Images that could be neither optimized nor copied get the usual
+    [Image not found: ...] marker instead of an empty src.
+    """
+    sources = {index: src_path for src_path, index in _IMAGE_JOBS.items()}
+
+    def missing(index):
+        src_path = sources.get(index, "")
+        log_warning(f"Image could not be written: {src_path} (in {filename})")
+        return f'[Image not found: {os.path.basename(src_path)}]'
+
+    def replace_tag(match):
+        new_path = _IMAGE_PATHS.get(int(match.group(1)))
+        if not new_path:
+            return missing(int(match.group(1)))
+        return match.group(0).replace(_IMAGE_PLACEHOLDER.format(match.group(1)), new_path)
+
+    def replace_placeholder(match):
+        return _IMAGE_PATHS.get(int(match.group(1))) or missing(int(match.group(1)))
+
+    html = _IMAGE_PLACEHOLDER_TAG_PATTERN.sub(replace_tag, html)
+    return _IMAGE_PLACEHOLDER_PATTERN.sub(replace_placeholder, html)
+
 def copy_asset(src_path):
     """
-    Copy an asset file to the assets directory, optimizing images if possible.
+    Copy an asset file to the assets directory.
+    Images are only queued for optimize_pending_images(); for those a placeholder
+    is returned that resolve_image_placeholders() swaps for the final path.
     Returns the new relative path.
     """
+    # Fast path for assets that were already handled. A single get() so a
+    # concurrent pop() of a failed reservation can't raise KeyError here
+    cached_path = _COPIED_ASSETS.get(src_path)
+    if cached_path is not None:
+        return cached_path
+    
     if not os.path.exists(src_path):
         return None
     
-    # Create a safe filename
-    filename = os.path.basename(src_path)
-    safe_filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
-    
     # Get file extension
-    ext = os.path.splitext(filename)[1].lower()
-    
-    # Handle images
-    if ext in ['.jpg', '.jpeg', '.png', '.webp']:
-        try:
-            # Optimize the image
-            optimized_data = optimize_image(src_path)
-            if optimized_data:
-                # Always save as .jpg for consistency
-                safe_filename = os.path.splitext(safe_filename)[0] + '.jpg'
-                dest_path = os.path.join(ASSETS_DIR, safe_filename)
-                
-                # Write the optimized image
-                with open(dest_path, 'wb') as f:
-                    f.write(optimized_data)
-                
-                print(f"Optimized image: {filename}")
-                return f"assets/{safe_filename}"
-        except Exception as e:
-            print(f"Failed to optimize image {filename}: {e}")
-            # Fall back to regular copy if optimization fails
+    ext = os.path.splitext(src_path)[1].lower()
+    is_image = ext in ['.jpg', '.jpeg', '.png', '.webp']
+    safe_filename = get_asset_filename(src_path)
     
-    # For non-image files or if optimization failed, just copy
-    dest_path = os.path.join(ASSETS_DIR, safe_filename)
-    shutil.copy2(src_path, dest_path)
+    # Look up or reserve the asset, so only one thread ever copies a given source
+    with _ASSETS_LOCK:
+        if src_path in _COPIED_ASSETS:
+            return _COPIED_ASSETS[src_path]
+        
+        # Handle images
+        if is_image:
+            index = _IMAGE_JOBS.setdefault(src_path, len(_IMAGE_JOBS))
+            _COPIED_ASSETS[src_path] = _IMAGE_PLACEHOLDER.format(index)
+            return _COPIED_ASSETS[src_path]
+        
+        # Return the relative path from the HTML file to the asset
+        _COPIED_ASSETS[src_path] = f"assets/{safe_filename}"
     
-    # Return the relative path from the HTML file to the asset
+    # For non-image files, just copy the contents; the source metadata doesn't matter
+    # for web output, and copyfile uses the kernel's zero-copy path where available.
+    # Different sources can share a safe filename, so the copy is renamed into place
+    try:
+        replace_file_with_copy(src_path, os.path.join(ASSETS_DIR, safe_filename))
+    except Exception:
+        # Drop the reservation so a later reference can retry the copy
+        with _ASSETS_LOCK:
+            _COPIED_ASSETS.pop(src_path, None)
+        raise
     return f"assets/{safe_filename}"
 
+def normalize_asset_name(filename):
+    """
+    Normalize an asset filename for lookup.
+    Returns (stem, ext): the stem lowercased without dashes or underscores, and the lowercased extension.
+    """
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    return _ASSET_NAME_SEPARATORS.sub('', stem.lower()), ext.lower()
+
+def build_asset_index():
+    """
+    Scan every asset location once and index the files by normalized name.
+    Each file is indexed under (stem, ext) and, for lookups that ignore the
+    extension, under (stem, None). Earlier locations take precedence over later ones.
+    """
+    ASSET_INDEX.clear()
+    count = 0
+    for location in ASSET_LOCATIONS:
+        location = os.path.expanduser(location)
+        if not os.path.isdir(location):
+            continue
+        with os.scandir(location) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stem, ext = normalize_asset_name(entry.name)
+                    ASSET_INDEX.setdefault((stem, ext), entry.path)
+                    ASSET_INDEX.setdefault((stem, None), entry.path)
+                    count += 1
+    log_info(f"Indexed {count} assets")
+
 def find_asset(filename):
     """
-    Try to find an asset in various possible locations.
+    Look up an asset in the asset index: first by name and extension, then by
+    name alone, and finally by a partial name match.
     """
-    # Common Logseq asset locations, starting with the configured path
-    possible_locations = [
-        LOGSEQ_ASSETS_PATH,  # Primary configured location
-        "assets",  # Current directory assets
-        "~/Documents/logseq/assets",  # Default Logseq location
-        os.path.expanduser("~/logseq/assets"),  # Alternative Logseq location
-        os.path.expanduser("~/Library/CloudStorage/SynologyDrive-on-demand/database/assets"),  # Synology location
-    ]
-    
-    # Clean up filename - try different variations
-    variations = [
-        filename,  # Original filename
-        filename.replace('_-_', '-'),  # Replace _-_ with -
-        filename.replace('-', '_'),  # Replace - with _
-        filename.replace('_', '-'),  # Replace _ with -
-    ]
+    stem, ext = normalize_asset_name(filename)
+    full_path = ASSET_INDEX.get((stem, ext)) or ASSET_INDEX.get((stem, None))
+    if full_path:
+        return full_path
     
-    # Remove duplicates while preserving order
-    variations = list(dict.fromkeys(variations))
-    
-    print(f"Looking for asset: {filename}")
-    print(f"Trying variations: {variations}")
-    
-    # Try each location with each variation
-    for location in possible_locations:
-        location = os.path.expanduser(location)
-        if os.path.exists(location):
-            print(f"Checking location: {location}")
-            
-            # Try exact matches first
-            for variant in variations:
-                full_path = os.path.join(location, variant)
-                if os.path.exists(full_path):
-                    print(f"Found exact match: {full_path}")
-                    return full_path
-            
-            # If no exact match, try partial matching
-            basename_no_ext = os.path.splitext(os.path.basename(filename))[0]
-            base_variations = [
-                basename_no_ext,
-                basename_no_ext.replace('_-_', '-'),
-                basename_no_ext.replace('-', '_'),
-                basename_no_ext.replace('_', '-')
-            ]
-            base_variations = list(dict.fromkeys(base_variations))
-            
-            for file in os.listdir(location):
-                file_lower = file.lower()
-                for base_variant in base_variations:
-                    if base_variant.lower() in file_lower:
-                        full_path = os.path.join(location, file)
-                        print(f"Found partial match: {full_path}")
-                        return full_path
+    # If no exact match, try partial matching
+    if stem:
+        for (indexed_stem, indexed_ext), full_path in ASSET_INDEX.items():
+            if indexed_ext is None and stem in indexed_stem:
+                print(f"Found partial match: {full_path}")
+                return full_path
     
     print(f"Asset not found: {filename}")
     return None
@@ -563,11 +856,15 @@ def process_image_links(content):
     Process image links in the content and copy images to assets directory.
     """
     def repl(match):
+        # Leave images that were already queued by an earlier pattern alone
+        if _IMAGE_PLACEHOLDER_PATTERN.fullmatch(match.group(1)):
+            return match.group(0)
+        
         img_path = unquote(match.group(1))
         
         # Remove any ../ from the path and strip any leading assets/ or img/
-        img_path = re.sub(r'\.\./+', '', img_path)
-        img_path = re.sub(r'^(assets/|img/)', '', img_path)
+        img_path = _PARENT_DIRS.sub('', img_path)
+        img_path = _ASSET_DIR_PREFIX.sub('', img_path)
         
         # Try to find the asset
         asset_path = find_asset(img_path)
@@ -579,11 +876,8 @@ def process_image_links(content):
         return f'[Image not found: {img_path}]'
     
     # Match both Markdown and HTML image patterns
-    md_pattern = r'!\[(?:[^\]]*)\]\(([^)]+)\)'
-    html_pattern = r'<img[^>]+src="([^"]+)"[^>]*>'
-    
-    content = re.sub(md_pattern, repl, content)
-    content = re.sub(html_pattern, repl, content)
+    content = _MD_IMAGE.sub(repl, content)
+    content = _HTML_IMAGE.sub(repl, content)
     return content
 
 def get_page_hierarchy(pages):
@@ -598,7 +892,7 @@ def get_page_hierarchy(pages):
     
     # First pass: collect all base categories and their direct pages
     for title, page_info in pages.items():
-        parts = title.split('/')
+        parts = page_info["parts"]
         base_category = parts[0]
         
         # If this is a base page or we haven't found a page for this category yet
@@ -617,7 +911,7 @@ def get_page_hierarchy(pages):
     
     # Then collect children under their respective parents
     for title, page_info in pages.items():
-        parts = title.split('/')
+        parts = page_info["parts"]
         if len(parts) > 1:
             parent = parts[0]
             if parent not in child_pages:
@@ -640,15 +934,11 @@ def preprocess_markdown(content):
         return ""
     
     # Handle Logseq-specific syntax
-    content = re.sub(r'#\[\[([^\]]+)\]\]', r'[\1](\1)', content)  # Convert #[[tag]] to [tag](tag)
-    content = re.sub(r'\(\(([a-f0-9-]+)\)\)', '', content)  # Remove block references
+    content = _TAG_LINK.sub(r'[\1](\1)', content)  # Convert #[[tag]] to [tag](tag)
+    content = _BLOCK_REF.sub('', content)  # Remove block references
     
     # Fix Logseq's task markers
-    content = re.sub(r'^DONE ', '- [x] ', content, flags=re.MULTILINE)
-    content = re.sub(r'^DOING ', '- [ ] ', content, flags=re.MULTILINE)
-    content = re.sub(r'^TODO ', '- [ ] ', content, flags=re.MULTILINE)
-    content = re.sub(r'^NOW ', '- [ ] ', content, flags=re.MULTILINE)
-    content = re.sub(r'^LATER ', '- [ ] ', content, flags=re.MULTILINE)
+    content = _TASK_MARKER_LINES.sub(lambda m: _TASK_CHECKBOXES[m.group(1)], content)
     
     # Fix Logseq's property syntax
     content = format_properties(content)
@@ -659,7 +949,10 @@ def preprocess_markdown(content):
     return content
 
 def block_tree_to_html(block, title, public_pages, indent=0):
-    """Convert a block tree to HTML."""
+    """
+    Convert a block tree to HTML.
+    Images are left as placeholders; write the result with write_pages().
+    """
     if not block:
         return ""
 
@@ -675,15 +968,8 @@ def block_tree_to_html(block, title, public_pages, indent=0):
     content = resolve_links_for_html(content, public_pages)
     content = process_image_links(content)
     
-    # Create markdown renderer with custom options
-    markdown = mistune.create_markdown(
-        escape=False,  # Don't escape HTML
-        plugins=['strikethrough', 'footnotes', 'table'],
-        hard_wrap=True  # Convert newlines to <br>
-    )
-    
     # Convert markdown to HTML
-    html_content = markdown(content) if content else ""
+    html_content = _MD(content) if content else ""
     
     # Process children
     if children:
@@ -697,25 +983,22 @@ def block_tree_to_html(block, title, public_pages, indent=0):
         return f"<li>{html_content}</li>"
     return html_content
 
-def generate_html_file(title, content, public_pages):
-    """Generate an HTML file for a page."""
-    # Create markdown renderer with custom options
-    markdown = mistune.create_markdown(
-        escape=False,  # Don't escape HTML
-        plugins=['strikethrough', 'footnotes', 'table'],
-        hard_wrap=True  # Convert newlines to <br>
-    )
-    
+def generate_html_file(title, content, public_pages, children_index):
+    """
+    Generate the HTML document for a page.
+    Returns (filename, html). Images are left as placeholders; write the
+    result with write_pages().
+    """
     # Process content
     content = preprocess_markdown(content)
     content = resolve_links_for_html(content, public_pages)
     content = process_image_links(content)
     
     # Convert to HTML
-    html_content = markdown(content)
+    html_content = _MD(content)
     
     # Generate hierarchy section
-    hierarchy_html = generate_hierarchy_section(title, public_pages)
+    hierarchy_html = generate_hierarchy_section(title, public_pages, children_index)
     
     # Create the complete HTML document
     html = f"""<!DOCTYPE html>
@@ -723,7 +1006,7 @@ def generate_html_file(title, content, public_pages):
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
+    <title>{esc(title)}</title>
     <link rel="stylesheet" href="{CSS_FILE}">
 </head>
 <body>
@@ -736,67 +1019,92 @@ def generate_html_file(title, content, public_pages):
     <main>
         <button class="open-sidebar" aria-label="Open navigation">☰</button>
         <article>
-            <h1>{title}</h1>
+            <h1>{esc(title)}</h1>
             {html_content}
         </article>
     </main>
 </body>
 </html>"""
     
-    # Write to file
     filename = get_page_filename(public_pages[title])
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(html)
-    
-    return filename
+    return filename, html
+
+def page_link_html(page_name, public_pages):
+    """Render a link to a page, or a plain span if the page isn't public."""
+    if page_name in public_pages:
+        safe_name = get_page_filename(public_pages[page_name])
+        return f'<a href="{safe_name}">{esc(page_name)}</a>'
+    # For non-public pages, use a span with a special class
+    return f'<span class="non-public-link">{esc(page_name)}</span>'
 
 def resolve_links_for_html(content, public_pages):
     """Process links in content to point to the correct HTML files."""
+    return _PAGE_LINK.sub(lambda m: page_link_html(m.group(1), public_pages), content)
+
+def format_inline(line, public_pages):
+    """
+    Convert Logseq's inline markup in a single line to HTML in one regex pass.
+    Text inside bold, italic, strikethrough and highlight is formatted recursively.
+    """
     def repl(match):
-        page_name = match.group(1)
-        if page_name in public_pages:
-            safe_name = get_page_filename(public_pages[page_name])
-            return f'<a href="{safe_name}">{page_name}</a>'
-        # For non-public pages, use a span with a special class
-        return f'<span class="non-public-link">{page_name}</span>'
+        group = match.lastindex
+        text = match.group(group)
+        if group == 1:
+            return f'<strong><em>{format_inline(text, public_pages)}</em></strong>'
+        if group in _INLINE_TAGS:
+            tag = _INLINE_TAGS[group]
+            return f'<{tag}>{format_inline(text, public_pages)}</{tag}>'
+        if group == 6:
+            return f'<code>{text}</code>'
+        if group == 7:
+            return f'<a href="{text}">{text}</a>'
+        return page_link_html(text, public_pages)
     
-    link_pattern = r'\[\[([^\]]+)\]\]'
-    return re.sub(link_pattern, repl, content)
+    return _INLINE.sub(repl, line)
 
 def resolve_embeds_in_block(block, processed, public_pages):
     """
-    Recursively resolve embed markers in the block's content and its children.
+    Resolve embed markers in the block's content and its children.
     Only includes content from public pages.
     """
     if processed is None:
         processed = set()
     
-    block_uuid = block.get("uuid")
-    if block_uuid:
-        if block_uuid in processed:
-            return block
-        processed.add(block_uuid)
+    # Walk the tree depth-first with an explicit stack instead of recursing
+    blocks = []
+    stack = deque([block])
+    while stack:
+        current = stack.pop()
+        block_uuid = current.get("uuid")
+        if block_uuid:
+            if block_uuid in processed:
+                continue
+            processed.add(block_uuid)
+        
+        current["content"] = resolve_embeds(current.get("content", ""), processed, public_pages)
+        blocks.append(current)
+        stack.extend(reversed(current.get("children", [])))
     
-    content = block.get("content", "")
-    block["content"] = resolve_embeds(content, processed, public_pages)
-    block["content"] = resolve_links_for_html(block["content"], public_pages)
-    block["content"] = process_image_links(block["content"])
+    # Resolve the links of all blocks in one pass over their joined content
+    contents = [b["content"] for b in blocks]
+    resolved = resolve_links_for_html(_BLOCK_SEPARATOR.join(contents), public_pages).split(_BLOCK_SEPARATOR)
+    if len(resolved) != len(blocks):
+        # Some content contains the separator itself, fall back to one block at a time
+        resolved = [resolve_links_for_html(content, public_pages) for content in contents]
     
-    if "children" in block:
-        for child in block["children"]:
-            resolve_embeds_in_block(child, processed, public_pages)
+    for current, content in zip(blocks, resolved):
+        current["content"] = process_image_links(content)
     
     return block
 
 def clean_logseq_metadata(content):
     """Remove Logseq-specific metadata from content."""
     # Remove block IDs
-    content = re.sub(r'\s*id::\s*[a-f0-9-]+', '', content)
+    content = _BLOCK_ID.sub('', content)
     # Remove UUIDs
-    content = re.sub(r'\s*[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}', '', content)
+    content = _UUID.sub('', content)
     # Remove public property
-    content = re.sub(r'\s*public::\s*(true|children)', '', content)
+    content = _PUBLIC_PROPERTY.sub('', content)
     return content
 
 def format_properties(content):
@@ -804,17 +1112,32 @@ def format_properties(content):
     Format Logseq properties as a semantic HTML description list within a section.
     Properties are identified by the :: pattern, excluding certain system properties.
     """
-    # Find all property definitions (key:: value)
-    property_pattern = r'^([a-zA-Z][a-zA-Z0-9-_]*)::(.+?)$'
-    properties = []
-    
-    # Process each line to find properties
     lines = []
-    in_properties = False
     property_lines = []
     
-    for line in content.split('\n'):
-        match = re.match(property_pattern, line.strip())
+    def _emit(props):
+        """Append the description list for a run of properties to lines."""
+        section_id = f'props-{hash(tuple(props)) & 0xFFFFFFFF}'
+        dl_parts = [
+            f'<section id="{section_id}" class="page-properties" aria-label="Page properties">\n',
+            '<h2 class="visually-hidden">Page Properties</h2>\n',  # Hidden but semantic heading
+            '<dl role="list">\n',
+        ]
+        for prop_key, prop_value in props:
+            # Create unique IDs for key-value pairs for better accessibility
+            key_id = f'prop-{hash(prop_key) & 0xFFFFFFFF}'
+            dl_parts.append(f'    <div class="property-pair" role="listitem">\n')
+            dl_parts.append(f'    <dt id="{key_id}">{prop_key}</dt>\n')
+            dl_parts.append(f'    <dd aria-labelledby="{key_id}">{prop_value}</dd>\n')
+            dl_parts.append('    </div>\n')
+        dl_parts.append('</dl>\n')
+        dl_parts.append('</section>\n')
+        lines.append(''.join(dl_parts))
+    
+    # Process each line once, collecting runs of consecutive properties
+    for line in content.splitlines():
+        stripped = line.strip()
+        match = _PROPERTY.match(stripped)
         if match:
             key, value = match.groups()
             # Skip system properties
@@ -822,46 +1145,20 @@ def format_properties(content):
                 property_lines.append((key.strip(), value.strip()))
             continue
         
-        # If we have properties and hit a non-property line, format them
-        if property_lines and not match:
-            if property_lines:
-                section_id = f'props-{hash("".join([k+v for k,v in property_lines])) & 0xFFFFFFFF}'
-                dl_html = f'<section id="{section_id}" class="page-properties" aria-label="Page properties">\n'
-                dl_html += '<h2 class="visually-hidden">Page Properties</h2>\n'  # Hidden but semantic heading
-                dl_html += '<dl role="list">\n'
-                for prop_key, prop_value in property_lines:
-                    # Create unique IDs for key-value pairs for better accessibility
-                    key_id = f'prop-{hash(prop_key) & 0xFFFFFFFF}'
-                    dl_html += f'    <div class="property-pair" role="listitem">\n'
-                    dl_html += f'    <dt id="{key_id}">{prop_key}</dt>\n'
-                    dl_html += f'    <dd aria-labelledby="{key_id}">{prop_value}</dd>\n'
-                    dl_html += f'    </div>\n'
-                dl_html += '</dl>\n'
-                dl_html += '</section>\n'
-                lines.append(dl_html)
-                property_lines = []
+        # A non-property line ends the current run of properties
+        if property_lines:
+            _emit(property_lines)
+            property_lines = []
         
-        if line.strip():
+        if stripped:
             # Wrap non-empty lines in paragraph tags if they don't start with HTML tags
-            if not line.strip().startswith('<'):
+            if not stripped.startswith('<'):
                 line = f'<p>{line}</p>'
             lines.append(line)
     
     # Handle any remaining properties at the end
     if property_lines:
-        section_id = f'props-{hash("".join([k+v for k,v in property_lines])) & 0xFFFFFFFF}'
-        dl_html = f'<section id="{section_id}" class="page-properties" aria-label="Page properties">\n'
-        dl_html += '<h2 class="visually-hidden">Page Properties</h2>\n'  # Hidden but semantic heading
-        dl_html += '<dl role="list">\n'
-        for prop_key, prop_value in property_lines:
-            key_id = f'prop-{hash(prop_key) & 0xFFFFFFFF}'
-            dl_html += f'    <div class="property-pair" role="listitem">\n'
-            dl_html += f'    <dt id="{key_id}">{prop_key}</dt>\n'
-            dl_html += f'    <dd aria-labelledby="{key_id}">{prop_value}</dd>\n'
-            dl_html += f'    </div>\n'
-        dl_html += '</dl>\n'
-        dl_html += '</section>\n'
-        lines.append(dl_html)
+        _emit(property_lines)
     
     return '\n'.join(lines)
 
@@ -870,9 +1167,10 @@ def main():
     # Setup output directory
     setup_output_directory()
 
-    # Get all public pages
+    # Fetch the page list once and share it with every step below
     print("Fetching public pages...")
-    public_pages = get_public_pages()
+    pages_by_name = get_pages_by_name(get_all_pages())
+    public_pages = get_public_pages(pages_by_name)
     if not public_pages:
         print("No public pages found.")
         sys.exit(1)
@@ -881,27 +1179,41 @@ def main():
     for title in public_pages:
         print(f"- {title}")
 
+    # Index the page hierarchy once for the "Related Pages" sections
+    children_index = build_children_index(public_pages)
+
+    # Fetch all block trees up front in one concurrent batch
+    with console.status("[blue]Fetching page blocks...", spinner="dots"):
+        uuids = [page_info["uuid"] for page_info in public_pages.values()]
+        blocks_cache = asyncio.run(gather_blocks(uuids))
+    log_success(f"Fetched blocks for {len(blocks_cache)} pages")
+
     # Generate index page
     print("\nGenerating index page...")
-    generate_index_page(public_pages)
+    generate_index_page(public_pages, blocks_cache)
     print("Generated: index.html")
 
-    # Process each public page
-    for title, page_info in public_pages.items():
-        print(f"\nProcessing page: {title}")
-        
-        # Export the page using Logseq's API
-        html_content = export_page_to_html(title, public_pages)
-        if not html_content:
-            print(f"Failed to export page: {title}")
-            continue
-        
-        # Write to file
-        filename = get_page_filename(page_info)
-        filepath = os.path.join(OUTPUT_DIR, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        print(f"Generated: {filename}")
+    # Export the public pages in parallel; images are only collected here
+    exported_pages = {}  # Filename -> HTML
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+        futures = {
+            pool.submit(export_page_to_html, title, public_pages, pages_by_name, blocks_cache, children_index): title
+            for title in public_pages
+        }
+        for future in as_completed(futures):
+            title = futures[future]
+            try:
+                html_content = future.result()
+            except Exception as e:
+                log_error(f"Exception while exporting {title}: {e}")
+                continue
+            if not html_content:
+                print(f"Failed to export page: {title}")
+                continue
+            exported_pages[get_page_filename(public_pages[title])] = html_content
+
+    # Optimize the images and write the pages
+    write_pages(exported_pages)
 
     print(f"\nAll HTML files have been generated in the '{OUTPUT_DIR}' directory.")
 